@@ -9,37 +9,46 @@
 #
 # Our graph looks like this:
 #
-#   [START]
-#      ↓
-#   [router_node]  ← reads the message, decides what to do
+#   [START]  ← route_from_start() reads the message, decides what to do
 #      ↓ (conditional)
 #      ├─── "browsing/checkout" ──→ [agent_node] ← LLM thinks + uses tools
 #      │                                ↓
 #      │                          (conditional: did LLM call a tool?)
-#      │                              ├─── YES → [tools_node] → back to [agent_node]
+#      │                              ├─── YES → [tools_node] ×N → back to [agent_node]
+#      │                              │          (one parallel task per tool call)
 #      │                              └─── NO  → [END]
 #      │
 #      └─── "human needed" ──→ [handoff_node] → [END]
 #
-# The SqliteSaver checkpointer saves the ENTIRE AgentState to disk
+# The AsyncSqliteSaver checkpointer saves the ENTIRE AgentState to disk
 # after every node execution, keyed by thread_id.
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.types import Send
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langchain_groq import ChatGroq
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
 
 from app.agent.state import AgentState
 from app.agent.tools import ALL_TOOLS
+from app.agent.llm_cache import cached_llm_call
 from app.models.database import MEMORY_DB_PATH
-import json
-import sqlite3
+from functools import lru_cache
+from typing import TypedDict
+import asyncio
+import logging
+import re
+import aiosqlite
+
+logger = logging.getLogger("denimai.agent")
 
 
 # =============================================================================
 # STEP 1: Initialize the LLM
+# Built ONCE per process — creating ChatGroq and generating the tool
+# JSON schemas in bind_tools() is real work we don't want on every message.
 # =============================================================================
+@lru_cache(maxsize=1)
 def get_llm():
     from app.core.config import settings
 
@@ -55,6 +64,16 @@ def get_llm():
     return llm.bind_tools(ALL_TOOLS)
 
 
+@cached_llm_call(ttl=300)
+async def call_llm(messages: list) -> AIMessage:
+    """
+    Sends the prompt to Groq. Identical prompts within 5 minutes reuse the
+    previous text reply (see llm_cache.py) instead of making a new API call.
+    Cached replies don't stream — no on_chat_model_stream events for them.
+    """
+    return await get_llm().ainvoke(messages)
+
+
 # =============================================================================
 # STEP 2: The System Prompt
 # This is the LLM's "personality card" — it sets context for every response
@@ -79,118 +98,215 @@ You currently know these vibes: Old Money, Minimalist, Streetwear, Smart Casual.
 """
 
 
+# Built once and never modified — the prompt prefix stays byte-identical
+# across turns so provider prompt caches can reuse it
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+
 # =============================================================================
-# STEP 3: Router Node
-# The "traffic cop" — reads the message and sets current_intent
-# This runs FIRST before any LLM call
+# STEP 3: Router
+# The "traffic cop" — reads the message and picks the first node.
+# This runs FIRST before any LLM call. It's a conditional entry point rather
+# than a node, so it costs no checkpoint write of its own.
 # =============================================================================
-def router_node(state: AgentState) -> dict:
+
+# Phrases that send a conversation to a human. Everything else — checkout
+# included — goes to the agent, which picks the right tool itself.
+HUMAN_TRIGGERS = [
+    "human", "real person", "agent", "support", "help me",
+    "this is wrong", "i'm frustrated", "frustrated", "angry",
+    "not happy", "speak to someone", "talk to someone"
+]
+
+
+# Words in a lowercased message ("i'm" stays one token)
+_TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def _compile_triggers(triggers: list) -> tuple:
     """
-    Analyzes the latest user message and sets current_intent.
-    This is a simple rule-based router — fast and deterministic.
-    No LLM call needed here (saves API tokens).
+    Splits an intent's triggers into a frozenset of single words (checked
+    with one set intersection against the message's words) and a regex for
+    the few multi-word phrases. Phrases containing a trigger word are left
+    out — the word already catches them.
     """
-    # Get the last message the user sent
-    last_message = state["messages"][-1]
-    text = last_message.content.lower() if hasattr(last_message, 'content') else ""
-
-    print(f"\n🔀 Router analyzing: '{text}'")
-
-    # Check for human escalation signals FIRST (highest priority)
-    human_triggers = [
-        "human", "real person", "agent", "support", "help me",
-        "this is wrong", "i'm frustrated", "frustrated", "angry",
-        "not happy", "speak to someone", "talk to someone"
-    ]
-    if any(trigger in text for trigger in human_triggers):
-        print("  ↳ Intent: HUMAN ESCALATION")
-        return {"current_intent": "support", "requires_human": True}
-
-    # Check for checkout intent
-    checkout_triggers = [
-        "checkout", "buy", "purchase", "order", "pay",
-        "place order", "buy it", "i'll take it", "confirm"
-    ]
-    if any(trigger in text for trigger in checkout_triggers):
-        print("  ↳ Intent: CHECKOUT")
-        return {"current_intent": "checkout", "requires_human": False}
-
-    # Check for cart-related intent
-    cart_triggers = ["cart", "what's in my cart", "my cart", "show cart"]
-    if any(trigger in text for trigger in cart_triggers):
-        print("  ↳ Intent: CART VIEW")
-        return {"current_intent": "browsing", "requires_human": False}
-
-    # Default: browsing / product inquiry
-    print("  ↳ Intent: BROWSING")
-    return {"current_intent": "browsing", "requires_human": False}
+    words = frozenset(t for t in triggers if " " not in t)
+    phrases = [t for t in triggers if " " in t and words.isdisjoint(t.split())]
+    phrase_re = re.compile("|".join(map(re.escape, phrases))) if phrases else None
+    return words, phrase_re
+
+
+# Compiled once at import, not per message
+_HUMAN_WORDS, _HUMAN_PHRASE_RE = _compile_triggers(HUMAN_TRIGGERS)
+
+
+def _has_trigger(text: str, tokens: set, words: frozenset, phrase_re) -> bool:
+    if not words.isdisjoint(tokens):
+        return True
+    return phrase_re is not None and phrase_re.search(text) is not None
+
+
+def detect_intent(text: str) -> str:
+    """
+    Rule-based intent detection on a lowercased message.
+    Fast and deterministic — no LLM call needed here (saves API tokens).
+
+    Triggers match whole words, so "agent" doesn't fire on "agentic".
+
+    Returns "support" or "browsing". Checkout isn't detected here: routing
+    only needs to know if a human should take over, and the agent handles
+    checkout like any other request.
+    """
+    # Tokenize once; every single-word check is a set lookup
+    tokens = set(_TOKEN_RE.findall(text))
+
+    if _has_trigger(text, tokens, _HUMAN_WORDS, _HUMAN_PHRASE_RE):
+        return "support"
+
+    # Checkout, cart views and product inquiries all go to the agent
+    return "browsing"
+
+
+def route_from_start(state: AgentState) -> str:
+    """
+    Conditional entry point: reads the latest user message and returns
+    the name of the first node to visit.
+    """
+    # Messages always carry .content; `or ""` covers a None content
+    text = (getattr(state["messages"][-1], "content", "") or "").lower()
+
+    intent = detect_intent(text)
+    logger.debug("🔀 Router: %r → %s", text, intent)
+
+    return "handoff_node" if intent == "support" else "agent_node"
 
 
 # =============================================================================
 # STEP 4: Agent Node
 # The main LLM node — the AI thinks, reads state, and decides what to do
 # =============================================================================
-def agent_node(state: AgentState) -> dict:
+async def agent_node(state: AgentState) -> dict:
     """
     The core AI node. The LLM reads the conversation and either:
     A) Responds directly with text
     B) Calls a tool (search_inventory, manage_cart, etc.)
 
-    If it calls a tool, LangGraph automatically routes to ToolNode,
+    If it calls a tool, LangGraph routes each call to tools_node,
     executes the function, and comes BACK here with the result.
     """
-    llm = get_llm()
+    # Already includes any cart changes from the tools that just ran
+    cart = state.get("user_cart") or []
 
     # Build the message list: system prompt + full conversation history
-    messages = [SystemMessage(content=SYSTEM_PROMPT)] + state["messages"]
+    messages = [SYSTEM_MESSAGE] + state["messages"]
 
-    # Add cart context so the LLM always knows what's in the cart
-    if state.get("user_cart"):
-        cart_context = f"\n[Current cart product IDs: {state['user_cart']}]"
-        messages[0] = SystemMessage(content=SYSTEM_PROMPT + cart_context)
+    # Add cart context so the LLM always knows what's in the cart.
+    # It goes at the END — the cart changes turn to turn, and putting it in
+    # the system prompt would invalidate the cached prefix every time.
+    if cart:
+        messages.append(SystemMessage(content=f"[Current cart product IDs: {cart}]"))
 
-    print(f"\n🤖 Agent thinking... (cart: {state.get('user_cart', [])})")
+    logger.debug("🤖 Agent thinking... (cart: %s)", cart)
 
-    # This is the actual LLM call — sends messages to Groq API
-    response = llm.invoke(messages)
+    # This is the actual LLM call — sends messages to Groq API.
+    # Awaited, so the event loop keeps serving other chats meanwhile.
+    response = await call_llm(messages)
 
-    print(f"  ↳ LLM response type: {'tool_call' if response.tool_calls else 'text'}")
+    logger.debug("  ↳ LLM response type: %s", "tool_call" if response.tool_calls else "text")
 
     return {"messages": [response]}
 
 
 # =============================================================================
 # STEP 5: Tools Node
-# Executes whatever tool the LLM decided to call
-# LangGraph's built-in ToolNode handles this automatically
+# Executes ONE tool call the LLM decided to make.
+# route_after_agent() sends every tool call here as its own task via
+# LangGraph's Send API, so when the LLM asks for several tools at once
+# (e.g. two searches) they run in parallel instead of one after another.
 # =============================================================================
-# ToolNode takes our list of tools and knows how to:
-#   1. Find the right function by name
-#   2. Pass the right arguments
-#   3. Return the result back into the messages state
-tools_node = ToolNode(ALL_TOOLS)
+
+# Looks up the right function by the name the LLM used
+TOOLS_BY_NAME = {t.name: t for t in ALL_TOOLS}
+
+
+class ToolCallState(TypedDict):
+    """The input each tools_node task gets: a single tool call."""
+    call: dict
+
+
+async def tools_node(state: ToolCallState) -> dict:
+    """
+    Runs one tool call and returns its result as a ToolMessage.
+    Errors are sent back to the LLM as the tool result (like LangGraph's
+    ToolNode does) so it can correct itself instead of crashing the turn.
+    """
+    call = state["call"]
+    tool = TOOLS_BY_NAME.get(call["name"])
+
+    if tool is None:
+        result = ToolMessage(
+            content=f"Error: {call['name']} is not a valid tool.",
+            tool_call_id=call["id"], name=call["name"], status="error"
+        )
+        return {"messages": [result]}
+
+    try:
+        # Invoking a tool with the full tool call returns a ToolMessage.
+        # Our tools are sync, so LangChain runs them on a worker thread.
+        result = await tool.ainvoke({**call, "type": "tool_call"})
+    except Exception as e:
+        result = ToolMessage(
+            content=f"Error: {type(e).__name__}: {e}\nPlease fix your mistakes.",
+            tool_call_id=call["id"], name=call["name"], status="error"
+        )
+        return {"messages": [result]}
+
+    # Cart tools attach {"action": ..., "product_id": ...} as the
+    # ToolMessage artifact on success; everything else has none.
+    # Writing it to user_cart here saves the cart change in the same
+    # checkpoint as the tool result (see apply_cart_ops in state.py).
+    cart_op = getattr(result, "artifact", None)
+    if not cart_op:
+        return {"messages": [result]}
+
+    if cart_op.get("action") == "checkout":
+        logger.info("Checkout complete. Clearing cart.")
+    return {"messages": [result], "user_cart": [cart_op]}
 
 
 # =============================================================================
 # STEP 6: Handoff Node  
-# Fires when requires_human = True
+# Fires when the router detects a human escalation
 # In a real system, this would create a support ticket or notify staff
 # =============================================================================
+# Shared with runner.py, which sends this directly when the router would
+# pick the handoff path anyway
+HANDOFF_TEXT = (
+    "I totally understand, and I want to make sure you get the best help possible. 🙏\n\n"
+    "I'm connecting you with a real person from our team right now. "
+    "Someone will be with you within a few minutes.\n\n"
+    "In the meantime, feel free to describe your issue and they'll have full context."
+)
+
+
 def handoff_node(state: AgentState) -> dict:
     """
     Handles escalation to human support.
     Currently sends a message; in production this would ping your support team.
+
+    run_agent() short-circuits obvious escalations before the graph runs,
+    so this node is the safety net for anything that reaches it another way.
     """
-    print("\n🚨 ESCALATION: Routing to human agent")
+    logger.info("🚨 ESCALATION: Routing to human agent")
 
-    handoff_message = AIMessage(content=(
-        "I totally understand, and I want to make sure you get the best help possible. 🙏\n\n"
-        "I'm connecting you with a real person from our team right now. "
-        "Someone will be with you within a few minutes.\n\n"
-        "In the meantime, feel free to describe your issue and they'll have full context."
-    ))
+    handoff_message = AIMessage(content=HANDOFF_TEXT)
 
-    return {"messages": [handoff_message]}
+    # The intent is only recorded on this path — routing never needed it
+    return {
+        "messages": [handoff_message],
+        "current_intent": "support",
+        "requires_human": True,
+    }
 
 
 # =============================================================================
@@ -199,99 +315,73 @@ def handoff_node(state: AgentState) -> dict:
 # next node to route to. LangGraph uses these to decide where to go next.
 # =============================================================================
 
-def route_after_router(state: AgentState) -> str:
-    """
-    Called after router_node.
-    Returns the name of the next node to visit.
-    """
-    if state.get("requires_human"):
-        return "handoff_node"
-    return "agent_node"
-
-
-def route_after_agent(state: AgentState) -> str:
+def route_after_agent(state: AgentState):
     """
     Called after agent_node.
-    If the LLM made tool calls → go execute them.
+    If the LLM made tool calls → one tools_node task per call (in parallel).
     If the LLM gave a text reply → we're done.
     """
     last_message = state["messages"][-1]
 
     # Check if the LLM response includes tool calls
     if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-        return "tools_node"
+        return [Send("tools_node", {"call": call}) for call in last_message.tool_calls]
 
     return END
 
 
 # =============================================================================
-# STEP 8: Cart State Updater
-# After tool execution, parse the tool output to update the cart state
-# (LangGraph's ToolNode doesn't automatically update custom state fields)
+# STEP 8: Cart Updates
+# There's no cart node: tools_node writes each cart tool's artifact into
+# user_cart, and the apply_cart_ops reducer in state.py applies it. That way
+# the cart change is checkpointed together with the tool result itself.
 # =============================================================================
 
-def update_cart_state(state: AgentState) -> dict:
-    """Deterministically updates the cart by parsing JSON tool outputs."""
-    last_message = state["messages"][-1]
-
-    # ToolNode outputs "ToolMessage" objects
-    if last_message.type == "tool":
-        try:
-            # Try to parse the tool output as JSON
-            data = json.loads(last_message.content)
-            
-            if data.get("status") == "success":
-                current_cart = state.get("user_cart", [])
-                pid = data.get("product_id")
-                action = data.get("action")
-                
-                if action == "add" and pid not in current_cart:
-                    return {"user_cart": current_cart + [pid]}
-                    
-                elif action == "remove" and pid in current_cart:
-                    return {"user_cart": [x for x in current_cart if x != pid]}
-                    
-                # NEW: Clear the cart when checkout is successful!
-                elif action == "checkout":
-                    print("  ↳ Checkout complete. Clearing cart.")
-                    return {"user_cart": []}
-                    
-        except json.JSONDecodeError:
-            # If the tool returned standard text instead of JSON, just ignore it
-            pass
-
-    return {}
-
 
 # =============================================================================
 # STEP 9: Build and Compile the Graph
 # This is where we wire all nodes together with edges
 # =============================================================================
-def build_graph():
+
+# Applied once to the checkpointer connection (cache_size is in KiB → 20MB)
+CHECKPOINT_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+"""
+
+
+def _trace_checkpoint_sql(statement: str):
+    """sqlite3 trace callback — logs the checkpointer's SQL as it runs."""
+    if "checkpoint" in statement:
+        logger.info("[checkpoint SQL] %s", statement.strip())
+
+
+async def build_graph():
     """
     Assembles all nodes and edges into the final compiled LangGraph.
     Returns a compiled graph ready to run conversations.
+
+    Async because the checkpointer's aiosqlite connection has to be opened
+    inside the running event loop.
     """
 
     # Create the graph builder with our state schema
     builder = StateGraph(AgentState)
 
     # ── Add all nodes ─────────────────────────────────────────────────────────
-    builder.add_node("router_node", router_node)
     builder.add_node("agent_node", agent_node)
     builder.add_node("tools_node", tools_node)
     builder.add_node("handoff_node", handoff_node)
-    builder.add_node("update_cart", update_cart_state)
 
     # ── Add edges (the flow) ──────────────────────────────────────────────────
 
-    # Always start at the router
-    builder.add_edge(START, "router_node")
-
-    # After router: go to agent OR handoff depending on requires_human
+    # From START: go to agent OR handoff depending on the message
     builder.add_conditional_edges(
-        "router_node",
-        route_after_router,
+        START,
+        route_from_start,
         {
             "agent_node": "agent_node",
             "handoff_node": "handoff_node"
@@ -302,34 +392,70 @@ def build_graph():
     builder.add_conditional_edges(
         "agent_node",
         route_after_agent,
-        {
-            "tools_node": "tools_node",
-            END: END
-        }
+        ["tools_node", END]
     )
 
-    # After tools execute: update cart state, then go back to agent
-    # (The agent will read the tool result and form a reply)
-    builder.add_edge("tools_node", "update_cart")
-    builder.add_edge("update_cart", "agent_node")
+    # After tools execute: go back to agent (once all parallel calls finish)
+    # (The agent updates the cart, reads the tool results and forms a reply)
+    builder.add_edge("tools_node", "agent_node")
 
     # Handoff is a terminal node
     builder.add_edge("handoff_node", END)
 
     # ── Attach the memory checkpointer ───────────────────────────────────────
-    # SqliteSaver automatically saves the entire AgentState to disk
+    # AsyncSqliteSaver automatically saves the entire AgentState to disk
     # after every node execution, indexed by thread_id.
     # This is what gives the agent "memory" across messages.
-    conn = sqlite3.connect(MEMORY_DB_PATH, check_same_thread=False)
-    checkpointer = SqliteSaver(conn)
+    # aiosqlite runs the SQLite calls on its own thread, so checkpoint
+    # writes never block the event loop.
+    conn = await aiosqlite.connect(MEMORY_DB_PATH)
+
+    # Every node execution writes a checkpoint, so commit cost matters:
+    #   WAL            → readers don't block on the writer
+    #   synchronous    → NORMAL stays crash-safe in WAL mode and fsyncs far less
+    #   busy_timeout   → wait for a lock instead of failing with SQLITE_BUSY
+    await conn.executescript(CHECKPOINT_PRAGMAS)
+
+    # Dev aid: logs the checkpointer's SQL. Loading a thread (aget_tuple)
+    # is 2 SELECTs — checkpoints, then writes. Only alist() (state history)
+    # runs one writes query per checkpoint, and a graph run never calls it
+    from app.core.config import settings
+    if settings.trace_checkpoint_sql:
+        await conn.set_trace_callback(_trace_checkpoint_sql)
+
+    checkpointer = AsyncSqliteSaver(conn)
 
     # Compile turns the builder into a runnable graph
     graph = builder.compile(checkpointer=checkpointer)
 
-    print("✅ LangGraph compiled successfully.")
+    logger.info("✅ LangGraph compiled successfully.")
     return graph
 
 
-# Build the graph once when the module loads
-# (not on every message — that would be wasteful)
-compiled_graph = build_graph()
\ No newline at end of file
+# Built lazily, once per process, by get_graph() — not at import time, so
+# importing this module stays cheap and the aiosqlite connection is opened
+# inside the running event loop
+_graph = None
+_graph_lock = asyncio.Lock()
+
+
+async def get_graph():
+    """
+    Returns the compiled graph, building it on first use.
+    main.py calls this on startup so the first message doesn't pay for it.
+    """
+    global _graph
+    if _graph is None:
+        async with _graph_lock:
+            # Re-check: another task may have built it while we waited
+            if _graph is None:
+                _graph = await build_graph()
+    return _graph
+
+
+async def close_graph():
+    """Closes the checkpointer's SQLite connection (called on shutdown)."""
+    global _graph
+    if _graph is not None:
+        await _graph.checkpointer.conn.close()
+        _graph = None
@@ -0,0 +1,74 @@
+# app/agent/llm_cache.py
+#
+# A small in-process response cache for the LLM call in agent_node.
+#
+# Lots of WhatsApp turns are the same prompt byte-for-byte ("hi", "thanks",
+# "what's in my cart" on a fresh thread). When the exact same prompt
+# (system prompt + history + cart) comes in again within a few minutes,
+# we return the previous reply instead of paying for another Groq call.
+#
+# Only plain text replies are cached. Replies with tool calls are never
+# cached — what the tools return depends on live stock and cart state.
+#
+# A cache hit never calls the chat model, so it emits no
+# on_chat_model_stream events: run_agent()'s on_token callback gets NOTHING
+# for a cached reply — only the final text. Callers that stream tokens
+# must still handle a reply that arrives all at once.
+
+from functools import wraps
+import hashlib
+import json
+import time
+
+
+def prompt_key(messages: list) -> str:
+    """
+    Hashes everything the LLM sees in a prompt into a short cache key.
+    Tool calls and tool_call_ids are included, so two histories that only
+    differ in tool arguments never share a key.
+    """
+    parts = [
+        [m.type, m.content, getattr(m, "tool_calls", None), getattr(m, "tool_call_id", None)]
+        for m in messages
+    ]
+    raw = json.dumps(parts, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def cached_llm_call(ttl: float = 300, max_entries: int = 1024):
+    """
+    Decorator for an async `fn(messages) -> AIMessage`.
+
+    Args:
+        ttl:         Seconds a cached reply stays valid
+        max_entries: Oldest entries are evicted past this size
+    """
+    def decorator(fn):
+        cache = {}  # key → (expires_at, AIMessage)
+
+        @wraps(fn)
+        async def wrapper(messages: list):
+            key = prompt_key(messages)
+            now = time.monotonic()
+
+            hit = cache.get(key)
+            if hit is not None:
+                expires_at, cached = hit
+                if expires_at > now:
+                    # Fresh copy with no id — LangGraph gives it a new one,
+                    # so it never overwrites an earlier message in the thread
+                    return cached.model_copy()
+                del cache[key]
+
+            response = await fn(messages)
+
+            if not response.tool_calls:
+                if len(cache) >= max_entries:
+                    cache.pop(next(iter(cache)))
+                cache[key] = (now + ttl, response.model_copy(update={"id": None}))
+
+            return response
+
+        return wrapper
+
+    return decorator
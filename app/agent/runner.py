@@ -9,13 +9,45 @@
 # LangGraph internals, nodes, or state — it just sends a message and
 # gets a reply back. Clean separation of concerns.
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
 from langchain_core.messages import HumanMessage
-from app.agent.graph import compiled_graph
+from app.agent.graph import HANDOFF_TEXT, detect_intent, get_graph
 from app.agent.state import AgentState
-from app.models.database import SessionLocal
+from app.models.database import session_scope
 from app.models.models import Thread
 from datetime import datetime
 
+logger = logging.getLogger("denimai.agent")
+
+# thread_id → [asyncio.Lock, number of runs holding or waiting for it]
+_thread_locks = {}
+
+
+@asynccontextmanager
+async def thread_lock(thread_id: str):
+    """
+    Lets only ONE graph run per thread_id happen at a time.
+
+    Two quick messages from the same user would otherwise both start from
+    the same checkpoint, and the second write would silently discard the
+    first exchange (and its cart change). Different users never wait on
+    each other. A lock is dropped as soon as nobody holds or waits for it.
+    """
+    entry = _thread_locks.get(thread_id)
+    if entry is None:
+        entry = _thread_locks[thread_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _thread_locks[thread_id]
+
 
 def upsert_thread(thread_id: str, platform: str, user_name: str):
     """
@@ -31,15 +63,14 @@ def upsert_thread(thread_id: str, platform: str, user_name: str):
         platform:  "whatsapp", "messenger", or "instagram"
         user_name: Name from webhook payload
     """
-    db = SessionLocal()
-    try:
+    with session_scope() as db:
         existing = db.query(Thread).filter(Thread.thread_id == thread_id).first()
 
         if existing:
             # Returning customer — just update the timestamp
             existing.last_active = datetime.utcnow()
             db.commit()
-            print(f"  ↳ Returning customer: {user_name} ({thread_id})")
+            logger.debug("  ↳ Returning customer: %s (%s)", user_name, thread_id)
         else:
             # New customer — create a record
             new_thread = Thread(
@@ -50,22 +81,26 @@ def upsert_thread(thread_id: str, platform: str, user_name: str):
             )
             db.add(new_thread)
             db.commit()
-            print(f"  ↳ New customer registered: {user_name} ({thread_id})")
+            logger.info("New customer registered: %s (%s)", user_name, thread_id)
 
-    finally:
-        db.close()
 
-
-async def run_agent(thread_id: str, user_message: str, platform: str, user_name: str) -> str:
+async def run_agent(
+    thread_id: str,
+    user_message: str,
+    platform: str,
+    user_name: str,
+    on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
     """
     The main entry point for processing a user message through LangGraph.
 
     What happens here:
-    1. Register/update the user in the Thread table
+    1. Register/update the user in the Thread table (runs alongside the graph)
     2. Package the message as a HumanMessage
     3. Pass it to the compiled LangGraph with the thread_id config
-    4. LangGraph hydrates state from SqliteSaver (loads their history + cart)
-    5. Graph runs: router → agent → (tools?) → agent → end
+    4. LangGraph hydrates state from AsyncSqliteSaver (loads their history + cart)
+    5. Graph runs: route → agent → (tools?) → agent → end, streaming
+       LLM tokens to on_token as they arrive
     6. Extract the final AI reply from the output state
     7. Return the reply text to webhook.py
 
@@ -74,19 +109,38 @@ async def run_agent(thread_id: str, user_message: str, platform: str, user_name:
         user_message: Raw text the user sent
         platform:     "whatsapp", "messenger", or "instagram"
         user_name:    User's name from webhook
+        on_token:     Optional async callback fed each LLM token as it
+                      streams in (e.g. for a typing indicator or live UI).
+                      Not called for replies served from the LLM cache
+                      (see llm_cache.py) — use the return value for those
 
     Returns:
         The AI's reply as a plain string
     """
-    print(f"\n{'='*60}")
-    print(f"🚀 run_agent() called")
-    print(f"   Thread:   {thread_id}")
-    print(f"   Platform: {platform}")
-    print(f"   Message:  '{user_message}'")
-    print(f"{'='*60}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "🚀 run_agent() | thread=%s platform=%s message=%r",
+            thread_id, platform, user_message
+        )
 
     # ── Step 1: Register user in business DB ─────────────────────────────────
-    upsert_thread(thread_id, platform, user_name)
+    # SQLAlchemy is synchronous — run it on a worker thread so the event
+    # loop stays free for other webhooks. The graph doesn't read the Thread
+    # row, so the upsert overlaps the LLM call instead of delaying it.
+    upsert_task = asyncio.create_task(
+        asyncio.to_thread(upsert_thread, thread_id, platform, user_name)
+    )
+
+    # ── Short-circuit: obvious human escalation ──────────────────────────────
+    # The router would send this straight to the canned handoff reply anyway.
+    # Answer it here instead — no checkpoint read/write, no graph run.
+    if detect_intent(user_message.lower()) == "support":
+        logger.info("🚨 ESCALATION: Handing off before the graph runs")
+        try:
+            await upsert_task
+        except Exception as e:
+            logger.exception("❌ Thread upsert error: %s: %s", type(e).__name__, e)
+        return HANDOFF_TEXT
 
     # ── Step 2: Build the input for LangGraph ────────────────────────────────
     # LangGraph expects a dict matching our AgentState schema.
@@ -108,9 +162,29 @@ async def run_agent(thread_id: str, user_message: str, platform: str, user_name:
 
     # ── Step 4: Run the graph ─────────────────────────────────────────────────
     try:
-        # .invoke() runs the graph synchronously from START to END
-        # and returns the FINAL state after all nodes have executed
-        final_state = compiled_graph.invoke(input_state, config=config)
+        # .astream_events() runs the graph from START to END and yields
+        # events as they happen — including each LLM token the moment Groq
+        # sends it, so on_token sees the first token, not the last.
+        # The LLM call and checkpoint writes are awaited, so other webhooks
+        # keep flowing meanwhile.
+        # Messages from the same user run one after another (see thread_lock)
+        compiled_graph = await get_graph()
+        final_state = None
+        async with thread_lock(thread_id):
+            async for event in compiled_graph.astream_events(
+                input_state, config=config, version="v2"
+            ):
+                kind = event["event"]
+
+                if kind == "on_chat_model_stream" and on_token is not None:
+                    token = event["data"]["chunk"].content
+                    if token:
+                        await on_token(token)
+
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # The root run ending carries the FINAL state after all
+                    # nodes have executed
+                    final_state = event["data"]["output"]
 
         # ── Step 5: Extract the last AI message as the reply ─────────────────
         # messages[-1] is always the most recent message
@@ -120,15 +194,23 @@ async def run_agent(thread_id: str, user_message: str, platform: str, user_name:
         # Get the text content of the reply
         reply = last_message.content if hasattr(last_message, 'content') else str(last_message)
 
-        print(f"\n✅ Agent reply: '{reply[:100]}...' " if len(reply) > 100 else f"\n✅ Agent reply: '{reply}'")
+        logger.info("✅ Agent reply: %.100r", reply)
 
         return reply
 
     except Exception as e:
         # If the agent crashes for any reason, send a safe fallback message
         # Don't expose error details to the customer
-        print(f"\n❌ Agent error: {type(e).__name__}: {e}")
+        logger.exception("❌ Agent error: %s: %s", type(e).__name__, e)
         return (
             "Sorry, I'm having a little trouble right now. 😅 "
             "Please try again in a moment, or type 'human' if you need immediate help."
-        )
\ No newline at end of file
+        )
+
+    finally:
+        # Collect the upsert so its errors get logged — a failed audit write
+        # shouldn't cost the customer their reply
+        try:
+            await upsert_task
+        except Exception as e:
+            logger.exception("❌ Thread upsert error: %s: %s", type(e).__name__, e)
\ No newline at end of file
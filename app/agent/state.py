@@ -16,18 +16,154 @@
 # tomorrow, the agent instantly "remembers" their cart and history.
 
 from typing import TypedDict, Annotated, List
+from langchain_core.messages import SystemMessage
 from langgraph.graph.message import add_messages
 
+# History window: the first message + the most recent turns
+MAX_MESSAGES = 10
+
+# Tool results that fall out of the window are folded into ONE summary
+# message. It has a fixed id so each trim replaces it instead of stacking.
+TOOL_SUMMARY_ID = "earlier-tool-results"
+MAX_TOOL_NOTES = 3
+TOOL_NOTE_CHARS = 120
+
+
+def _is_repeat_tool_result(messages: list, i: int) -> bool:
+    """True if messages[i] is the same tool result as the message before it."""
+    if i == 0:
+        return False
+    prev, msg = messages[i - 1], messages[i]
+    return (
+        msg.type == "tool" and prev.type == "tool"
+        and msg.tool_call_id == prev.tool_call_id
+        and msg.content == prev.content
+    )
+
+
+def _summarize_tool_results(dropped: list):
+    """
+    Collapses the tool results being trimmed away (plus any previous summary)
+    into one short SystemMessage. Returns None if there's nothing to keep.
+    """
+    notes = []
+    for msg in dropped:
+        if msg.id == TOOL_SUMMARY_ID:
+            # Carry over the notes from the previous summary
+            notes.extend(line[2:] for line in msg.content.splitlines()[1:])
+        elif msg.type == "tool":
+            text = " ".join(str(msg.content).split())
+            notes.append(text[:TOOL_NOTE_CHARS])
+
+    notes = notes[-MAX_TOOL_NOTES:]
+    if not notes:
+        return None
+
+    content = "[earlier tool results]\n" + "\n".join(f"- {note}" for note in notes)
+    return SystemMessage(id=TOOL_SUMMARY_ID, content=content)
+
+
+def _message_units(messages: list) -> list:
+    """
+    Groups messages into units that are kept or dropped together: each
+    message plus the tool results right after it. An AIMessage with tool
+    calls and its ToolMessages always travel as one unit — the API rejects
+    a tool call without its results, and a result without its call.
+    """
+    units = []
+    for msg in messages:
+        if msg.type == "tool" and units:
+            units[-1].append(msg)
+        else:
+            units.append([msg])
+    return units
+
+
 def trim_messages(existing: list, new: list):
     """
     Automatically keeps the history lean to prevent 429 Rate Limit errors.
+
+    The first message is always kept so the start of the prompt stays the
+    same from turn to turn (that's what provider prompt caches key on).
+
+    This runs on EVERY write — including each parallel tools_node result in
+    the middle of a turn — so it never trims past the latest HumanMessage.
+    The current turn stays whole even if it alone exceeds MAX_MESSAGES.
     """
     # 1. Combine new messages with the existing ones
     combined = add_messages(existing, new)
-    
-    # 2. Keep only the last 10 messages (standard for chat bots)
-    # This keeps the bot 'smart' but prevents token bloat.
-    return combined[-10:]
+
+    # 2. Drop tool results that were replayed twice in a row
+    combined = [
+        msg for i, msg in enumerate(combined)
+        if not _is_repeat_tool_result(combined, i)
+    ]
+
+    if len(combined) <= MAX_MESSAGES:
+        return combined
+
+    # 3. Keep the anchor + the most recent turns, leaving one slot for the
+    #    tool summary. This keeps the bot 'smart' but prevents token bloat.
+    #    The previous summary is always folded into the new one.
+    anchor, rest = combined[0], combined[1:]
+    dropped = [msg for msg in rest if msg.id == TOOL_SUMMARY_ID]
+    units = _message_units([msg for msg in rest if msg.id != TOOL_SUMMARY_ID])
+
+    # The current turn (latest HumanMessage onwards) is always kept
+    start = next(
+        (i for i in range(len(units) - 1, -1, -1) if units[i][0].type == "human"),
+        len(units),
+    )
+    size = sum(len(unit) for unit in units[start:])
+
+    # Walk back through older units while they fit. A unit that starts with
+    # a tool result lost its tool call in an earlier trim, so it can't be
+    # replayed — it (and everything before it) goes into the summary
+    keep = MAX_MESSAGES - 2
+    while (
+        start > 0
+        and units[start - 1][0].type != "tool"
+        and size + len(units[start - 1]) <= keep
+    ):
+        start -= 1
+        size += len(units[start])
+
+    dropped.extend(msg for unit in units[:start] for msg in unit)
+    window = [msg for unit in units[start:] for msg in unit]
+
+    summary = _summarize_tool_results(dropped)
+    return [anchor] + ([summary] if summary else []) + window
+
+
+def apply_cart_ops(existing: list, ops: list):
+    """
+    Reducer for user_cart: applies cart operations instead of replacing
+    the whole list.
+
+    tools_node writes each cart tool's artifact here — {"action": "add" |
+    "remove", "product_id": ...} or {"action": "checkout"} — so the cart
+    change is saved in the SAME checkpoint as the tool result. If the LLM
+    call that follows fails, the change (e.g. a completed checkout) is
+    already on disk and can't be lost.
+    """
+    cart = list(existing or [])
+
+    for op in ops or []:
+        action = op.get("action")
+        pid = op.get("product_id")
+
+        if action == "add" and pid not in cart:
+            cart.append(pid)
+
+        elif action == "remove":
+            cart = [x for x in cart if x != pid]
+
+        # Clear the cart when checkout is successful!
+        elif action == "checkout":
+            cart = []
+
+    return cart
+
 
 class AgentState(TypedDict):
     """
@@ -46,11 +182,14 @@ class AgentState(TypedDict):
     #   - It's temporary and session-specific
     #   - The SqliteSaver persists it automatically
     #   - We only write to the products DB when they actually check out
-    user_cart: List[int]
+    #
+    # Nodes don't write the list itself — they write cart operations, and
+    # apply_cart_ops() folds them into the saved cart.
+    user_cart: Annotated[List[int], apply_cart_ops]
 
     # ── Current Intent ────────────────────────────────────────────────────────
     # What is the user trying to do RIGHT NOW?
-    # The router node sets this based on the latest message.
+    # Only recorded by the handoff node; routing reads the message directly.
     #
     # Possible values:
     #   "browsing"  → user is asking about products, wants to see options
@@ -60,8 +199,8 @@ class AgentState(TypedDict):
     current_intent: str
 
     # ── Human Escalation Flag ─────────────────────────────────────────────────
-    # When True, the graph routes to the handoff node instead of the AI node.
-    # Set to True when:
+    # Set to True by the handoff node once a conversation has been escalated.
+    # Escalation triggers:
     #   - User explicitly asks for a human ("let me talk to someone")
     #   - User expresses strong frustration 3+ times
     #   - Agent fails to help after 2 attempts
@@ -15,18 +15,28 @@
 #
 # This prevents hallucination — the LLM only tells the customer what's
 # actually in the database.
+import logging
+from collections import Counter
 from typing import Optional
 from langchain_core.tools import tool
-from app.models.database import SessionLocal
+from sqlalchemy import insert, update
+from app.models.database import session_scope
 from app.models.models import Product, Order, Thread
+from app.services import catalog_cache
 from datetime import datetime
-import json
+
+logger = logging.getLogger("denimai.agent")
 
 # =============================================================================
 # TOOL 1: search_inventory
 # READ operation — queries the products table
 # The LLM calls this when the user asks about clothes
 # =============================================================================
+
+# Max products returned per search — a chat reply can't show more anyway
+SEARCH_LIMIT = 20
+
+
 @tool
 def search_inventory(
     category: str = None,
@@ -51,10 +61,13 @@ def search_inventory(
     Returns:
         A formatted string listing matching products, or a message if none found.
     """
-    db = SessionLocal()
-    try:
-        # Start with all products
-        query = db.query(Product)
+    with session_scope() as db:
+        # Start with all products — only the columns we display, as plain
+        # row tuples (no ORM objects built for a read-only listing)
+        query = db.query(
+            Product.id, Product.name, Product.color, Product.vibe,
+            Product.fit, Product.price, Product.stock
+        )
 
         # Apply filters only if the LLM provided them
         # Using ilike() for case-insensitive matching
@@ -68,7 +81,8 @@ def search_inventory(
         if max_price:
             query = query.filter(Product.price <= max_price)
 
-        products = query.all()
+        # Fetch one extra row so we know if there were more than the limit
+        products = query.order_by(Product.id).limit(SEARCH_LIMIT + 1).all()
 
         if not products:
             return (
@@ -77,7 +91,11 @@ def search_inventory(
             )
 
         # Format results into a clear string the LLM can read and talk about
-        lines = [f"Found {len(products)} product(s):\n"]
+        if len(products) > SEARCH_LIMIT:
+            products = products[:SEARCH_LIMIT]
+            lines = [f"Showing the first {SEARCH_LIMIT} matches (narrow the filters to see more):\n"]
+        else:
+            lines = [f"Found {len(products)} product(s):\n"]
         for p in products:
             stock_status = f"{p.stock} in stock" if p.stock > 0 else "❌ OUT OF STOCK"
             lines.append(
@@ -87,60 +105,65 @@ def search_inventory(
 
         return "\n".join(lines)
 
-    finally:
-        db.close()
-
 
 # =============================================================================
 # TOOL 2: manage_cart
 # UPDATE operation — modifies the cart inside LangGraph state
 # Note: This doesn't write to the database at all!
-# The cart lives in AgentState and is persisted by the SqliteSaver.
+# The cart lives in AgentState and is persisted by the AsyncSqliteSaver.
 # =============================================================================
-@tool
-def manage_cart(product_id: int, action: str) -> str:
+@tool(response_format="content_and_artifact")
+def manage_cart(product_id: int, action: str) -> tuple:
     """Add or remove a product from the customer's cart."""
-    db = SessionLocal()
-    try:
-        product = db.query(Product).filter(Product.id == product_id).first()
-
-        if not product:
-            return json.dumps({"error": f"Product ID {product_id} not found."})
-
-        if action == "add":
-            if product.stock == 0:
-                return json.dumps({"error": f"{product.name} is out of stock."})
-            
-            # Return strict JSON so graph.py can parse it flawlessly
-            return json.dumps({
-                "status": "success",
-                "action": "add",
-                "product_id": product_id,
-                "message": f"✅ Added {product.name} to cart."
-            })
-
-        elif action == "remove":
-            return json.dumps({
-                "status": "success",
-                "action": "remove",
-                "product_id": product_id,
-                "message": f"✅ Removed {product.name} from cart."
-            })
-    finally:
-        db.close()
+    # Returns (message for the LLM, artifact). The artifact is a small dict
+    # that graph.py reads directly to update the cart — no JSON parsing.
+    # Failures return None as the artifact so the cart is left alone.
+    # Served from the catalog cache — repeated cart operations skip the DB
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        return f"❌ Product ID {product_id} not found.", None
+
+    if action == "add":
+        if product.stock == 0:
+            return f"❌ {product.name} is out of stock.", None
+
+        return f"✅ Added {product.name} to cart.", {"action": "add", "product_id": product_id}
+
+    elif action == "remove":
+        return f"✅ Removed {product.name} from cart.", {"action": "remove", "product_id": product_id}
+
+    return f"❌ Unknown cart action '{action}'. Use 'add' or 'remove'.", None
+
+
+def _with_quantity(name: str, quantity: int) -> str:
+    """'Classic Oxford Shirt' → '2× Classic Oxford Shirt' (unchanged for 1)."""
+    return f"{quantity}× {name}" if quantity > 1 else name
+
+
+def _cart_counts(cart_product_ids: list) -> Counter:
+    """
+    Quantity per product id, with ids normalised to int ("3" → 3) so they
+    match the catalog. Anything non-numeric is kept as-is and ends up
+    reported as not found.
+    """
+    counts = Counter()
+    for pid in cart_product_ids:
+        product_id = catalog_cache.as_product_id(pid)
+        counts[pid if product_id is None else product_id] += 1
+    return counts
 
 
 # =============================================================================
 # TOOL 3: finalize_order
 # UPDATE + CREATE operation — the checkout process
 # This is the only tool that permanently writes to the database:
-#   1. Checks stock one final time (race condition protection)
-#   2. Decrements stock for each item in the cart
-#   3. Creates an Order record for each item
-#   4. Returns a receipt summary
+#   1. Decrements stock for each item — the stock check is part of the
+#      UPDATE itself (race condition protection)
+#   2. Creates one Order record per product (quantity = times it's in the cart)
+#   3. Returns a receipt summary
 # =============================================================================
-@tool
-def finalize_order(cart_product_ids: list, thread_id: str) -> str:
+@tool(response_format="content_and_artifact")
+def finalize_order(cart_product_ids: list[int], thread_id: str) -> tuple:
     """
     Complete the purchase for all items in the customer's cart.
     Decrements product stock and creates order records.
@@ -151,67 +174,106 @@ def finalize_order(cart_product_ids: list, thread_id: str) -> str:
 
     Returns:
         A receipt string confirming what was purchased, or an error message.
+        (Plus an {"action": "checkout"} artifact on success, which tells
+        graph.py to clear the cart.)
     """
     if not cart_product_ids:
-        return "❌ Your cart is empty. Add some products first!"
-
-    db = SessionLocal()
-    try:
-        receipt_lines = ["🧾 *Order Confirmation*\n"]
-        total = 0.0
-        failed_items = []
-
-        for product_id in cart_product_ids:
-            product = db.query(Product).filter(Product.id == product_id).first()
-
-            if not product:
-                failed_items.append(f"Product ID {product_id} (not found)")
-                continue
-
-            if product.stock < 1:
-                failed_items.append(f"{product.name} (out of stock)")
-                continue
-
-            # ── WRITE: Decrement stock ────────────────────────────────────────
-            product.stock -= 1
-
-            # ── WRITE: Create order record ────────────────────────────────────
-            order = Order(
-                thread_id=thread_id,
-                product_id=product.id,
-                quantity=1,
-                total_price=product.price,
-                ordered_at=datetime.utcnow()
+        return "❌ Your cart is empty. Add some products first!", None
+
+    with session_scope() as db:
+        try:
+            # Take SQLite's write lock up-front (BEGIN IMMEDIATE) so
+            # concurrent checkouts queue instead of hitting "database is locked"
+            db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+            sold = []          # (product, quantity) that passed the stock check
+            failed_items = []
+            order_rows = []
+            now = datetime.utcnow()
+
+            # Adding the same product twice means quantity 2 — one UPDATE
+            # and one order row per distinct product, not per cart entry
+            counts = _cart_counts(cart_product_ids)
+
+            # Ids that don't exist (stale cart, deleted product) are weeded
+            # out in memory — only real ones go into the IN query
+            known = catalog_cache.valid_ids()
+            lookup_ids = [pid for pid in counts if pid in known]
+
+            # One IN query for the whole cart instead of one query per item
+            by_id = {}
+            if lookup_ids:
+                rows = db.query(Product).filter(Product.id.in_(lookup_ids)).all()
+                by_id = {p.id: p for p in rows}
+
+            for product_id, quantity in counts.items():
+                product = by_id.get(product_id)
+
+                if not product:
+                    failed_items.append(f"Product ID {product_id} (not found)")
+                    continue
+
+                # ── WRITE: Decrement stock ────────────────────────────────────
+                # "stock >= quantity" lives in the UPDATE itself, so two
+                # concurrent checkouts can't both take the last units
+                result = db.execute(
+                    update(Product)
+                    .where(Product.id == product_id, Product.stock >= quantity)
+                    .values(stock=Product.stock - quantity)
+                )
+                if result.rowcount == 0:
+                    failed_items.append(f"{product.name} (out of stock)")
+                    continue
+
+                # ── Queue the order record (inserted in one batch below) ──────
+                order_rows.append({
+                    "thread_id": thread_id,
+                    "product_id": product.id,
+                    "quantity": quantity,
+                    "total_price": product.price * quantity,
+                    "ordered_at": now,
+                })
+                sold.append((product, quantity))
+
+            # ── WRITE: Create all order records in one executemany ───────────
+            if order_rows:
+                db.execute(insert(Order), order_rows)
+
+            # Commit all changes in one transaction
+            # If anything fails, nothing gets saved (atomic operation)
+            db.commit()
+
+            # Drop the cached snapshot of every product we looked at — not just
+            # what sold. An "out of stock" here means the cached stock was
+            # stale too, and get_cart_summary/manage_cart shouldn't keep it
+            catalog_cache.invalidate(counts.keys())
+
+            # ── Build the receipt in one pass over what was sold ──────────────
+            total = sum(row["total_price"] for row in order_rows)
+            receipt_lines = ["🧾 *Order Confirmation*\n"]
+            receipt_lines.extend(
+                f"  ✅ {_with_quantity(p.name, n)} ({p.color}) — ${p.price * n:.2f}"
+                for p, n in sold
             )
-            db.add(order)
-
-            total += product.price
-            receipt_lines.append(f"  ✅ {product.name} ({product.color}) — ${product.price:.2f}")
 
-        # Commit all changes in one transaction
-        # If anything fails, nothing gets saved (atomic operation)
-        db.commit()
+            if failed_items:
+                receipt_lines.append(f"\n⚠️ Couldn't process: {', '.join(failed_items)}")
 
-        if failed_items:
-            receipt_lines.append(f"\n⚠️ Couldn't process: {', '.join(failed_items)}")
+            receipt_lines.append(f"\n💳 *Total: ${total:.2f}*")
+            receipt_lines.append("Thank you for shopping with DenimAI! 🛍️")
 
-        receipt_lines.append(f"\n💳 *Total: ${total:.2f}*")
-        receipt_lines.append("Thank you for shopping with DenimAI! 🛍️")
-
-        receipt_string = "\n".join(receipt_lines)
-        
-        return json.dumps({
-            "status": "success",
-            "action": "checkout",
-            "message": receipt_string
-        })
+            receipt_string = "\n".join(receipt_lines)
+            logger.info(
+                "🧾 Checkout for %s: %d item(s), $%.2f, %d failed",
+                thread_id, sum(n for _, n in sold), total, len(failed_items)
+            )
 
-    except Exception as e:
-        db.rollback()  # If anything goes wrong, undo ALL changes
-        return f"❌ Checkout failed: {str(e)}. Please try again."
+            return receipt_string, {"action": "checkout"}
 
-    finally:
-        db.close()
+        except Exception as e:
+            db.rollback()  # If anything goes wrong, undo ALL changes
+            logger.exception("❌ Checkout failed for %s", thread_id)
+            return f"❌ Checkout failed: {str(e)}. Please try again.", None
 
 
 # =============================================================================
@@ -219,7 +281,7 @@ def finalize_order(cart_product_ids: list, thread_id: str) -> str:
 # READ operation — lets the LLM tell the user what's in their cart
 # =============================================================================
 @tool
-def get_cart_summary(cart_product_ids: list) -> str:
+def get_cart_summary(cart_product_ids: list[int]) -> str:
     """
     Get a human-readable summary of the items currently in the cart.
     Use this when the customer asks 'what's in my cart?' or before checkout.
@@ -233,24 +295,27 @@ def get_cart_summary(cart_product_ids: list) -> str:
     if not cart_product_ids:
         return "Your cart is empty. Want me to help you find something? 👕"
 
-    db = SessionLocal()
-    try:
-        lines = ["🛒 *Your Cart:*\n"]
-        total = 0.0
+    lines = ["🛒 *Your Cart:*\n"]
+    total = 0.0
 
-        for product_id in cart_product_ids:
-            product = db.query(Product).filter(Product.id == product_id).first()
-            if product:
-                lines.append(f"  • {product.name} ({product.color}) — ${product.price:.2f}")
-                total += product.price
+    # Read-only view — served from the catalog cache, so a repeat
+    # "what's in my cart?" doesn't touch the DB at all
+    counts = _cart_counts(cart_product_ids)
+    by_id = catalog_cache.get_products(counts)
 
-        lines.append(f"\n*Subtotal: ${total:.2f}*")
-        lines.append("Say 'checkout' to complete your order!")
+    for product_id, quantity in counts.items():
+        product = by_id.get(product_id)
+        if product:
+            lines.append(
+                f"  • {_with_quantity(product.name, quantity)} ({product.color})"
+                f" — ${product.price * quantity:.2f}"
+            )
+            total += product.price * quantity
 
-        return "\n".join(lines)
+    lines.append(f"\n*Subtotal: ${total:.2f}*")
+    lines.append("Say 'checkout' to complete your order!")
 
-    finally:
-        db.close()
+    return "\n".join(lines)
 
 
 # Export all tools as a list for easy import in graph.py
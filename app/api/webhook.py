@@ -3,6 +3,8 @@
 # UPDATED: Now calls run_agent() instead of the placeholder reply.
 # This is the final connection — Meta → webhook → LangGraph → reply → Meta
 
+import logging
+import orjson
 from fastapi import APIRouter, Request, Response, Query, HTTPException, BackgroundTasks
 from app.core.config import settings
 from app.services.normalization import normalize_meta_payload
@@ -11,6 +13,7 @@ from app.agent.runner import run_agent  # ← The new import
 
 router = APIRouter()
 meta_client = MetaClient()
+logger = logging.getLogger("denimai.webhook")
 
 
 @router.get("/webhook/meta")
@@ -20,10 +23,10 @@ async def verify_webhook(
     challenge: str = Query(None, alias="hub.challenge"),
 ):
     """Handles the one-time Meta Webhook Verification Handshake."""
-    print(f"\n🔐 Verification attempt | mode={mode} | token={token}")
+    logger.info("🔐 Verification attempt | mode=%s | token=%s", mode, token)
 
     if mode == "subscribe" and token == settings.meta_verify_token:
-        print("✅ Webhook verified!")
+        logger.info("✅ Webhook verified!")
         return Response(content=challenge, media_type="text/plain")
 
     raise HTTPException(status_code=403, detail="Verification failed.")
@@ -34,17 +37,40 @@ async def receive_message(request: Request, background_tasks: BackgroundTasks):
     """
     Receives all incoming messages from WhatsApp, Messenger, and Instagram.
     Returns 200 immediately to Meta, processes in background.
+
+    Only the raw bytes are read here — JSON parsing and normalization
+    happen in the background task, after Meta already has its 200.
+    """
+    raw = await request.body()
+    background_tasks.add_task(process_raw_payload, raw)
+    return {"status": "ok"}
+
+
+async def process_raw_payload(raw: bytes):
     """
-    payload = await request.json()
+    Parses and normalizes a webhook body, then replies if it's a message.
+    Runs as a BackgroundTask, off Meta's response path.
+    """
+    try:
+        payload = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        logger.error("❌ Webhook body is not valid JSON: %s", e)
+        return
+
+    # Valid JSON but not an object (e.g. [1, 2]) — normalize_meta_payload
+    # expects a dict, and nothing upstream would catch its error
+    if not isinstance(payload, dict):
+        logger.error("❌ Webhook body is not a JSON object: %s", type(payload).__name__)
+        return
+
     data = normalize_meta_payload(payload)
 
-    if data:
-        print(f"✅ [{data['platform'].upper()}] {data['user_name']}: '{data['text']}'")
-        background_tasks.add_task(handle_reply, data)
-    else:
-        print("  ↳ Non-message webhook event. Ignoring.")
+    if not data:
+        logger.debug("  ↳ Non-message webhook event. Ignoring.")
+        return
 
-    return {"status": "ok"}
+    logger.info("✅ [%s] %s: %r", data["platform"].upper(), data["user_name"], data["text"])
+    await handle_reply(data)
 
 
 async def handle_reply(data: dict):
@@ -65,11 +91,4 @@ async def handle_reply(data: dict):
     platform = data["platform"]
     sender_id = data["sender_id"]
 
-    if platform == "whatsapp":
-        await meta_client.send_whatsapp_message(sender_id, reply_text)
-    elif platform == "instagram":
-        await meta_client.send_instagram_message(sender_id, reply_text)
-    elif platform == "messenger":
-        await meta_client.send_messenger_message(sender_id, reply_text)
-    else:
-        print(f"⚠️ Unknown platform: {platform}")
\ No newline at end of file
+    await meta_client.send(platform, sender_id, reply_text)
\ No newline at end of file
@@ -0,0 +1,173 @@
+# app/cli/seed.py
+#
+# Run this ONCE to:
+#   1. Create the database tables
+#   2. Insert sample products into the inventory
+#   3. Verify everything looks correct
+#
+# How to run (from the project root):
+#   python -m app.cli.seed
+#
+# You can re-run it safely — it checks before inserting duplicates.
+# Importing this module has no side effects; only main() touches the DB.
+
+import csv
+import logging
+import sys
+from dataclasses import asdict, dataclass, fields
+from importlib.resources import files
+from itertools import islice
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.database import engine, init_db
+from app.models.models import Product, Thread, Order
+
+logger = logging.getLogger("denimai.seed")
+
+def create_tables():
+    """Creates all tables defined in models.py"""
+    # Same path as app startup: init_db() checks PRAGMA user_version first,
+    # so a re-run against an up-to-date DB does no per-table probes or DDL
+    init_db()
+
+
+# The sample inventory lives in app/data/products.csv (one row per product),
+# shipped inside the package so it's found no matter where you run from.
+# Edit the CSV to change what gets seeded — no code change needed.
+_PRODUCTS_CSV = files("app.data") / "products.csv"
+
+
+@dataclass(slots=True, frozen=True)
+class ProductSeed:
+    """One seed product — a typed, immutable row of products.csv."""
+    name: str
+    category: str
+    vibe: str
+    color: str
+    fit: Optional[str]
+    price: float
+    stock: int
+
+
+# SQLite before 3.32 allows at most 999 bound parameters per statement
+# (newer versions allow 32766). Size each multi-row INSERT to fit the old
+# limit: one parameter per column per row → 999 // 7 = 142 rows.
+_SQLITE_MAX_PARAMS = 999
+SEED_BATCH_SIZE = _SQLITE_MAX_PARAMS // len(fields(ProductSeed))
+
+
+def product_rows():
+    """
+    Yields one ProductSeed per CSV row, typed to match the Product columns.
+    Streams the file — rows are read as they're consumed.
+
+    Public so other code (tests, fixtures) can reuse the sample inventory
+    without going through seed_products().
+    """
+    with _PRODUCTS_CSV.open(newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield ProductSeed(
+                name=row["name"],
+                category=row["category"],
+                vibe=row["vibe"],
+                color=row["color"],
+                fit=row["fit"] or None,  # fit is nullable
+                price=float(row["price"]),
+                stock=int(row["stock"]),
+            )
+
+
+# INSERT ... ON CONFLICT DO NOTHING lives in the dialect modules
+_DIALECT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+
+def seed_products(engine):
+    """
+    Insert products only if they don't already exist.
+    Each batch commits in its own transaction, so a huge catalog never
+    holds one giant write transaction (or WAL) open.
+    """
+
+    # One statement does both the "exists?" check and the insert: rows whose
+    # name is already taken (uq_products_name) are skipped by the DB itself.
+    # Safe to re-run, even after a seed that died halfway.
+    dialect_insert = _DIALECT_INSERTS[engine.dialect.name]
+
+    # Consume the CSV SEED_BATCH_SIZE rows at a time — only one batch is
+    # ever in memory, however big the catalog file gets
+    rows = product_rows()
+    inserted = 0
+    while batch := [asdict(seed) for seed in islice(rows, SEED_BATCH_SIZE)]:
+        stmt = (
+            dialect_insert(Product)
+            .values(batch)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        with engine.begin() as conn:
+            inserted += conn.execute(stmt).rowcount
+    logger.info("✅ Added %d new products (no duplicates).", inserted)
+
+
+# verify()'s table layout — one template for the header and every row,
+# parsed once here instead of re-building the column specs per row
+_TABLE_ROW = "{id:<4} {name:<30} {vibe:<15} {color:<10} {stock:<6} {price}\n".format
+
+
+def verify(conn):
+    """Prints a summary of what's in the database"""
+    # The inventory table is this script's output, not a log line —
+    # it goes straight to stdout
+    sys.stdout.write(
+        "\n📦 Current Inventory:\n"
+        + _TABLE_ROW(id="ID", name="Name", vibe="Vibe", color="Color", stock="Stock", price="Price")
+        + "-" * 80 + "\n"
+    )
+    # Only the displayed columns, streamed in batches — no ORM objects and
+    # never the whole table in memory at once
+    rows = conn.execute(
+        select(Product.id, Product.name, Product.vibe, Product.color, Product.stock, Product.price)
+        .execution_options(yield_per=256)
+    )
+    # One stdout write per batch of rows instead of one print() per row
+    for batch in rows.partitions():
+        # Rows are plain tuples — unpack them instead of per-field lookups
+        sys.stdout.write("".join(
+            _TABLE_ROW(
+                id=pid, name=name, vibe=vibe, color=color,
+                stock=stock if stock > 0 else "❌ OUT", price=f"${price:.2f}",
+            )
+            for pid, name, vibe, color, stock, price in batch
+        ))
+
+
+def main():
+    """Creates the tables, seeds the sample inventory and prints it."""
+    # One handler for this run; plain messages on stdout, same as the old
+    # prints, so they stay in order with the inventory table
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    logger.info("🌱 Starting database seed...")
+
+    # Step 1: Create tables
+    create_tables()
+
+    # Step 2: Seed — one short transaction per batch, on plain Connections
+    # (no ORM Session needed for Core inserts and selects)
+    seed_products(engine)
+
+    # Step 3: Print what's there now
+    with engine.connect() as conn:
+        verify(conn)
+
+    logger.info("✅ Done! Your database is ready.")
+    logger.info("   Store DB:  denimAI_store.db")
+    logger.info("   Run your app: uvicorn app.main:app --reload")
+
+
+if __name__ == "__main__":
+    main()
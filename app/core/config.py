@@ -16,6 +16,12 @@ class Settings(BaseSettings):
     # LLM
     groq_api_key: str
 
+    # Dev only: log every SQL statement the checkpointer runs
+    trace_checkpoint_sql: bool = False
+
+    # Logging — DEBUG locally, WARNING in production to skip the chatter
+    log_level: str = "INFO"
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
\ No newline at end of file
@@ -1,18 +1,40 @@
 # app/main.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from app.api.webhook import router as webhook_router
+from app.core.config import settings
+from app.api.webhook import router as webhook_router, meta_client
 from app.models.database import init_db
+from app.agent.graph import get_graph, close_graph
+from app.services import catalog_cache
 
-app = FastAPI(title="DenimAI Backend")
+# One place configures logging for every "denimai.*" logger (LOG_LEVEL in .env)
+logging.basicConfig(
+    level=settings.log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("denimai.http")
 
-# ── Initialize database on startup ───────────────────────────────────────────
-# Creates tables if they don't exist yet.
-# Safe to run every time — it checks before creating.
-@app.on_event("startup")
-async def startup_event():
-    print("🚀 DenimAI starting up...")
-    init_db()
-    print("🏪 Store database ready.")
+# ── App lifecycle ────────────────────────────────────────────────────────────
+# Everything before `yield` runs on startup, everything after on shutdown.
+# init_db() is sync SQLAlchemy (creates tables if they don't exist yet —
+# safe to run every time), so it runs on a worker thread, not the event loop.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("🚀 DenimAI starting up...")
+    await asyncio.to_thread(init_db)
+    logger.info("🏪 Store database ready.")
+    await asyncio.to_thread(catalog_cache.valid_ids)  # Load the product id set
+    await get_graph()  # Warm the graph so the first message doesn't build it
+
+    yield
+
+    await meta_client.aclose()
+    await close_graph()
+
+
+app = FastAPI(title="DenimAI Backend", lifespan=lifespan)
 
 # ── Register routes ───────────────────────────────────────────────────────────
 app.include_router(webhook_router)
@@ -20,9 +42,10 @@ app.include_router(webhook_router)
 # ── Request logger middleware ─────────────────────────────────────────────────
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    print(f"DEBUG: {request.method} {request.url.path}")
-    response = await call_next(request)
-    return response
+    # Level check first — in production this is one int compare per request
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s", request.method, request.url.path)
+    return await call_next(request)
 
 @app.get("/")
 async def root():
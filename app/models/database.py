@@ -12,14 +12,20 @@
 #                      Managed by SQLAlchemy. YOU control the schema.
 #
 # langgraph_memory.db → LangGraph's checkpointer data (chat history, cart state)
-#                       Managed automatically by LangGraph's SqliteSaver.
+#                       Managed automatically by LangGraph's AsyncSqliteSaver.
 #                       You never write to this directly.
 #
 # Keeping them separate makes debugging easier — you can wipe chat memory
 # without touching your product catalog, and vice versa.
 
-from sqlalchemy import create_engine
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger("denimai.db")
 
 # ─── Business Database ───────────────────────────────────────────────────────
 
@@ -30,19 +36,76 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 #
 # connect_args={"check_same_thread": False} is required for SQLite when
 # used with FastAPI (which runs async, so multiple threads may share the DB)
+#
+# The pool keeps up to 10 connections open (+20 overflow under bursts), so
+# tool calls reuse an already-open connection with its PRAGMAs applied
+# instead of paying for a fresh sqlite3 open each time. No pre_ping or
+# recycle: a local SQLite file has no server to drop idle connections.
+#
+# insertmanyvalues_page_size caps how many rows SQLAlchemy packs into one
+# multi-row INSERT when it batches executemany() inserts (e.g. ORM flushes
+# of many new rows). 1000 is SQLAlchemy's default — pinned here so the
+# batch size is explicit and can't shift under a library upgrade.
 
 STORE_DB_URL = "sqlite:///./denimAI_store.db"
 
 engine = create_engine(
     STORE_DB_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+    insertmanyvalues_page_size=1000,
 )
 
+
+# Runs ONCE per new SQLite connection (not per session) — the pool keeps
+# connections open, so these settings stick for the connection's lifetime.
+#   journal_mode=WAL     → readers don't block on the writer
+#   synchronous=NORMAL   → far fewer fsyncs per commit, still crash-safe in WAL
+#   busy_timeout=5000    → wait up to 5s for a lock instead of "database is locked"
+#   temp_store=MEMORY    → sorts and temp tables stay in RAM
+#   mmap_size=128MB      → reads come straight from the OS page cache
+#   cache_size=-20000    → ~20MB page cache per connection (negative = KiB)
+#
+# Durability trade-off of synchronous=NORMAL: the DB can't be corrupted,
+# but a power cut / OS crash (not an app crash) can lose the last few
+# commits before the next WAL checkpoint. Acceptable here — an order lost
+# that way is rare, and the seed and schema setup are simply re-runnable.
+#
+# It also turns off the sqlite3 driver's own implicit BEGIN, so
+# _begin_sqlite_transaction() below decides how each transaction starts.
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=134217728")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.close()
+
+
+# Emits BEGIN ourselves. Plain BEGIN (DEFERRED) by default; a writer that
+# knows it's about to write can ask for the write lock up-front:
+#
+#     db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+#
+# Concurrent checkouts then queue on busy_timeout at BEGIN instead of
+# failing with "database is locked" halfway through their transaction.
+@event.listens_for(engine, "begin")
+def _begin_sqlite_transaction(conn):
+    mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+    conn.exec_driver_sql(f"BEGIN {mode}")
+
 # SessionLocal is a "session factory" — every time you call SessionLocal()
 # you get a fresh database session (like opening a new tab in a browser)
 SessionLocal = sessionmaker(
     autocommit=False,   # We manually commit changes (safer, more control)
     autoflush=False,    # Don't auto-save to DB until we say so
+    expire_on_commit=False,  # Objects stay readable after commit (no re-SELECT)
     bind=engine
 )
 
@@ -54,7 +117,7 @@ Base = declarative_base()
 
 # ─── LangGraph Memory Database ───────────────────────────────────────────────
 
-# This path is used in graph.py when we create the SqliteSaver.
+# This path is used in graph.py when we create the AsyncSqliteSaver.
 # We define it here so there's one central place to change it.
 MEMORY_DB_PATH = "./langgraph_memory.db"
 
@@ -82,6 +145,49 @@ def get_db():
         db.close()
 
 
+# The session opened by session_scope() in the current context, if any
+_current_session: ContextVar = ContextVar("current_session", default=None)
+
+
+@contextmanager
+def session_scope():
+    """
+    Opens a session, commits when the block finishes, rolls back on error,
+    and always closes it.
+
+        with session_scope() as db:
+            results = db.query(Product).all()
+
+    If a session_scope() is already open in the current context (e.g. a
+    helper called from inside a tool), that same session is reused instead
+    of checking out a second connection. Each asyncio task and worker
+    thread gets its own context, so parallel tools never share a session.
+    """
+    db = _current_session.get()
+    if db is not None:
+        yield db
+        return
+
+    db = SessionLocal()
+    token = _current_session.set(db)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        db.close()
+
+
+# Bump this whenever models.py gains a table or index. init_db() only runs
+# DDL when the store DB's PRAGMA user_version is older than this.
+SCHEMA_VERSION = 2
+# v1: tables + lookup indexes
+# v2: uq_products_name (unique product names)
+
+
 def init_db():
     """
     Creates all tables in the database if they don't exist yet.
@@ -89,8 +195,37 @@ def init_db():
     
     SQLAlchemy reads all models that inherit from Base and generates
     the CREATE TABLE SQL for you automatically.
+
+    Indexes are created too, including ones added to models after their
+    table already exists (create_all skips existing tables entirely).
+
+    Gated on SQLite's PRAGMA user_version: once the DB is at
+    SCHEMA_VERSION, startup is a single PRAGMA read with no DDL. The check
+    runs under BEGIN IMMEDIATE, so when several workers boot at once only
+    the first runs the DDL and the rest wait, then see it's done.
+
+    All of the DDL (every CREATE TABLE / CREATE INDEX) runs in that one
+    transaction, so a fresh database pays for one commit, not one per table.
     """
     # Import models here so Base "knows" about them before create_all runs
     from app.models import models  # noqa: F401 — import needed for side effects
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created (or already exist).")
\ No newline at end of file
+
+    with engine.connect() as conn:
+        conn.execution_options(sqlite_begin="IMMEDIATE")
+        with conn.begin():
+            version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            if version >= SCHEMA_VERSION:
+                logger.info("✅ Database schema up to date (v%d).", version)
+                return
+
+            Base.metadata.create_all(bind=conn)
+
+            # Bring existing databases up to date with any newly declared indexes
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn, checkfirst=True)
+
+            # PRAGMA doesn't take bound parameters — SCHEMA_VERSION is our own int
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    logger.info("✅ Database tables created (schema v%d).", SCHEMA_VERSION)
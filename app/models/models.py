@@ -9,7 +9,7 @@
 #   2. Product — your store's inventory (the clothes you sell)
 #   3. Order   — a log of every successful purchase
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -58,12 +58,12 @@ class Product(Base):
 
     id       = Column(Integer, primary_key=True, index=True)
     name     = Column(String, nullable=False)
-    # e.g. "Classic Oxford Shirt"
+    # e.g. "Classic Oxford Shirt" — unique (see uq_products_name below)
 
-    category = Column(String, nullable=False)
+    category = Column(String, nullable=False, index=True)
     # e.g. "Top", "Bottom", "Outerwear"
 
-    vibe     = Column(String, nullable=False)
+    vibe     = Column(String, nullable=False, index=True)
     # e.g. "Old Money", "Minimalist", "Streetwear"
     # This is a DenimAI-specific filter — lets users say "show me Old Money fits"
 
@@ -76,7 +76,7 @@ class Product(Base):
     price    = Column(Float, nullable=False)
     # In USD e.g. 49.99
 
-    stock    = Column(Integer, default=0)
+    stock    = Column(Integer, default=0, index=True)
     # Number of units available. Decremented on checkout.
     # If 0, the agent should tell the customer it's out of stock.
 
@@ -118,4 +118,20 @@ class Order(Base):
     product = relationship("Product", back_populates="orders")
 
     def __repr__(self):
-        return f"<Order #{self.id} | Thread: {self.thread_id} | Product: {self.product_id}>"
\ No newline at end of file
+        return f"<Order #{self.id} | Thread: {self.thread_id} | Product: {self.product_id}>"
+
+
+# =============================================================================
+# Extra indexes
+# Ones the single-column index=True flags above can't express. Declared as
+# Index objects so init_db() can add them to tables that already exist.
+# =============================================================================
+
+# One product per name — lets the seeder use INSERT ... ON CONFLICT DO NOTHING
+Index("uq_products_name", Product.name, unique=True)
+
+# "Show me Streetwear tops" — vibe + category filtered together
+Index("ix_products_vibe_category", Product.vibe, Product.category)
+
+# A user's order history, newest first
+Index("ix_orders_thread_time", Order.thread_id, Order.ordered_at.desc())
\ No newline at end of file
@@ -0,0 +1,135 @@
+# app/services/catalog_cache.py
+#
+# A small in-process cache of product snapshots for the read-only tools.
+#
+# Names, colors and prices almost never change, and cart views ask for the
+# same handful of products over and over ("what's in my cart?"). Instead of
+# a SQLite query per tool call, the tools read a ProductSnapshot from here.
+#
+# Stock DOES change, so:
+#   - entries expire after TTL_SECONDS (picks up restocks / other workers)
+#   - finalize_order() calls invalidate() for every product it checked out
+#   - finalize_order() itself never trusts this cache — its conditional
+#     UPDATE is what actually decides if something is in stock
+#
+# It also keeps the set of product ids that exist (valid_ids()), so a stale
+# or made-up cart id is rejected with a set lookup instead of a query.
+#
+# Per-process only. With several workers, each keeps its own copy; swap the
+# dict for Redis if stale stock for up to a minute ever matters.
+
+from dataclasses import dataclass
+import threading
+import time
+from typing import Iterable, Optional
+from app.models.database import session_scope
+from app.models.models import Product
+
+# How long a snapshot is trusted before it's re-read from the DB
+TTL_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class ProductSnapshot:
+    """The product fields the chat tools display — a plain, immutable copy."""
+    id: int
+    name: str
+    color: str
+    price: float
+    stock: int
+
+
+_cache = {}  # product_id → (expires_at, ProductSnapshot)
+
+# (expires_at, frozenset of every product id) — None until first use
+_valid_ids = None
+_valid_ids_lock = threading.Lock()
+
+
+def valid_ids() -> frozenset:
+    """
+    Returns the ids of every product in the catalog, re-read at most
+    once per TTL_SECONDS. Tools run on worker threads, so the refresh is
+    locked — one thread queries, the others reuse its result.
+    """
+    global _valid_ids
+    now = time.monotonic()
+    current = _valid_ids
+    if current is not None and current[0] > now:
+        return current[1]
+
+    with _valid_ids_lock:
+        # Re-check: another thread may have refreshed while we waited
+        current = _valid_ids
+        if current is not None and current[0] > now:
+            return current[1]
+
+        with session_scope() as db:
+            ids = frozenset(pid for (pid,) in db.query(Product.id))
+        _valid_ids = (time.monotonic() + TTL_SECONDS, ids)
+        return ids
+
+
+def as_product_id(value) -> Optional[int]:
+    """
+    Normalises an id from a tool call to an int — the LLM sometimes sends
+    "3" instead of 3, which would never match the int ids in valid_ids().
+    None for anything that isn't a number.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_products(product_ids: Iterable[int]) -> dict:
+    """
+    Returns {product_id: ProductSnapshot} for the given ids, keyed by int.
+
+    Cached ids cost nothing; the rest are loaded in ONE IN query.
+    Ids that aren't in valid_ids() are simply missing from the result,
+    without ever reaching the DB.
+    """
+    now = time.monotonic()
+    known = valid_ids()
+    found = {}
+    missing = set()
+
+    for pid in map(as_product_id, product_ids):
+        if pid not in known:
+            continue
+        hit = _cache.get(pid)
+        if hit is not None and hit[0] > now:
+            found[pid] = hit[1]
+        else:
+            missing.add(pid)
+
+    if missing:
+        with session_scope() as db:
+            rows = db.query(
+                Product.id, Product.name, Product.color, Product.price, Product.stock
+            ).filter(Product.id.in_(missing)).all()
+
+        expires_at = now + TTL_SECONDS
+        for row in rows:
+            snapshot = ProductSnapshot(*row)
+            _cache[snapshot.id] = (expires_at, snapshot)
+            found[snapshot.id] = snapshot
+
+    return found
+
+
+def get_product(product_id: int) -> Optional[ProductSnapshot]:
+    """Single-product version of get_products(). None if it doesn't exist."""
+    return get_products((product_id,)).get(as_product_id(product_id))
+
+
+def invalidate(product_ids: Optional[Iterable[int]] = None):
+    """Drops the given products from the cache — or everything, if None."""
+    global _valid_ids
+    if product_ids is None:
+        _cache.clear()
+        _valid_ids = None
+        return
+    for pid in product_ids:
+        _cache.pop(pid, None)
@@ -1,6 +1,23 @@
+import asyncio
+import logging
 import httpx
+import orjson
 from app.core.config import settings
 
+logger = logging.getLogger("denimai.meta")
+
+# Only rate limits (429) are retried: Meta rejected the message, so sending
+# it again is safe. A 5xx on a message POST may still have delivered it, and
+# a retry would send the customer the same reply twice — those are logged
+# and returned as-is, like any other error (bad token, bad recipient).
+RETRY_STATUSES = {429}
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 0.5   # 0.5s, then 1s (doubles each retry)
+# Longest we'll wait before a retry. A Retry-After beyond this gives up
+# instead — a reply that shows up an hour later is worse than none.
+MAX_BACKOFF_SECONDS = 10
+
+
 class MetaClient:
     def __init__(self):
         # WhatsApp Config
@@ -18,9 +35,48 @@ class MetaClient:
         # Instagram Config
         self.ig_token = settings.instagram_access_token
 
-    async def send_whatsapp_message(self, recipient_id: str, text: str):
-        """Sends a plain text message via WhatsApp Cloud API"""
-        payload = {
+        # One client for every reply — keeps the TCP + TLS connection to
+        # graph.facebook.com alive instead of a fresh handshake per message.
+        # Closed by aclose() on app shutdown.
+        self._client = httpx.AsyncClient(
+            timeout=10.0,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+
+        # Platform name → (label for logs, URL, headers, payload builder).
+        # The platforms only differ in these; send() does the rest.
+        self._specs = {
+            "whatsapp": (
+                "WhatsApp",
+                self.wa_base_url,
+                self.wa_headers,
+                self._whatsapp_payload,
+            ),
+            "messenger": (
+                "Messenger",
+                f"https://graph.facebook.com/v22.0/me/messages?access_token={self.fb_token}",
+                {"Content-Type": "application/json"},
+                self._messaging_payload,
+            ),
+            "instagram": (
+                "Instagram",
+                "https://graph.facebook.com/v22.0/me/messages",
+                None,
+                self._instagram_payload,
+            ),
+        }
+
+    async def aclose(self):
+        """Closes the shared HTTP client (call once, on shutdown)."""
+        await self._client.aclose()
+
+    # ── Payload builders ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def _whatsapp_payload(recipient_id: str, text: str) -> dict:
+        """WhatsApp Cloud API plain text message"""
+        return {
             "messaging_product": "whatsapp",
             "recipient_type": "individual",
             "to": recipient_id,
@@ -28,51 +84,66 @@ class MetaClient:
             "text": {"body": text},
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.wa_base_url, 
-                json=payload, 
-                headers=self.wa_headers
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ WhatsApp Error: {response.text}")
-            else:
-                print(f"✅ WhatsApp reply sent to {recipient_id}")
-            
-            return response.json()
-        
-    async def send_messenger_message(self, recipient_id: str, text: str):
-        """Sends a plain text message via Facebook Messenger API"""
-        url = f"https://graph.facebook.com/v22.0/me/messages?access_token={self.fb_token}"
-        
-        payload = {
+    @staticmethod
+    def _messaging_payload(recipient_id: str, text: str) -> dict:
+        """Facebook Messenger API plain text message"""
+        return {
             "recipient": {"id": recipient_id},
             "message": {"text": text}
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url, 
-                json=payload, 
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ Messenger Error: {response.text}")
-            else:
-                print(f"✅ Messenger reply sent to {recipient_id}")
-            
-            return response.json()
-            
-# In app/services/meta_client.py
-    async def send_instagram_message(self, recipient_id: str, text: str):
-        url = "https://graph.facebook.com/v22.0/me/messages"
-        payload = {
+    def _instagram_payload(self, recipient_id: str, text: str) -> dict:
+        """Instagram messaging — same shape as Messenger, token in the body"""
+        return {
             "recipient": {"id": recipient_id},
             "message": {"text": text},
             "access_token": self.ig_token  # Pass it here!
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
-            return response.json()
\ No newline at end of file
+
+    # ── Sending ──────────────────────────────────────────────────────────────
+
+    async def send(self, platform: str, recipient_id: str, text: str):
+        """
+        Sends a plain text reply on any supported platform.
+
+        Retries rate limits (429) with exponential backoff, honouring
+        Retry-After when Meta sends one (up to MAX_BACKOFF_SECONDS).
+
+        Returns Meta's JSON response, or None for an unknown platform.
+        """
+        spec = self._specs.get(platform)
+        if spec is None:
+            logger.warning("⚠️ Unknown platform: %s", platform)
+            return None
+
+        label, url, headers, build_payload = spec
+        payload = build_payload(recipient_id, text)
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            response = await self._client.post(url, json=payload, headers=headers)
+
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                break
+
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = BACKOFF_SECONDS * 2 ** (attempt - 1)
+            if delay > MAX_BACKOFF_SECONDS:
+                logger.warning(
+                    "⏳ %s asked us to wait %.0fs — not retrying", label, delay
+                )
+                break
+            logger.warning(
+                "⏳ %s returned %s — retry %d/%d in %.1fs",
+                label, response.status_code, attempt, MAX_ATTEMPTS - 1, delay
+            )
+            await asyncio.sleep(delay)
+
+        if response.status_code != 200:
+            logger.error("❌ %s Error: %s", label, response.text)
+        else:
+            logger.info("✅ %s reply sent to %s", label, recipient_id)
+
+        return orjson.loads(response.content)
@@ -5,6 +5,143 @@
 # app can understand — regardless of whether it came from WhatsApp,
 # Messenger, or Instagram.
 
+import logging
+
+logger = logging.getLogger("denimai.webhook")
+
+# Raised by a payload that doesn't have the shape its object type promises
+_PARSE_ERRORS = (KeyError, IndexError, TypeError, AttributeError)
+
+
+def _log_parse_error(e: Exception, payload: dict):
+    # If ANYTHING goes wrong parsing the payload, log it clearly.
+    # This tells you exactly what broke instead of silently failing.
+    logger.error("  ↳ ❌ NORMALIZATION ERROR: %s: %s", type(e).__name__, e)
+    logger.error("  ↳ Full payload was: %s", payload)
+
+
+# -------------------------------------------------------------------
+# ROUTE A: Messenger (Facebook Page messages)
+# Meta sends object = "page" for Messenger
+# -------------------------------------------------------------------
+def _parse_messenger(payload: dict):
+    try:
+        # Messenger uses a "messaging" array (not "changes")
+        messaging_event = payload["entry"][0].get("messaging", [{}])[0]
+        message_obj = messaging_event.get("message") or {}
+
+        # Make sure it's a real text message (not a sticker/emoji/attachment)
+        if "text" not in message_obj:
+            logger.debug("  ↳ Skipping non-text Messenger event (e.g. attachment, reaction).")
+            return None
+
+        # Skip "echo" events — these are copies of YOUR OWN replies
+        # coming back to you. Ignore them or you'll loop forever.
+        if message_obj.get("is_echo"):
+            logger.debug("  ↳ Skipping echo message from Messenger.")
+            return None
+
+        sender_id = messaging_event["sender"]["id"]
+        logger.debug("  ↳ Messenger message from sender_id: %s", sender_id)
+
+        return {
+            "platform": "messenger",
+            "sender_id": sender_id,
+            "thread_id": f"messenger_{sender_id}",
+            "text": message_obj["text"],
+            "user_name": "Customer",  # Messenger webhooks rarely include the name
+        }
+    except _PARSE_ERRORS as e:
+        _log_parse_error(e, payload)
+        return None
+
+
+# -------------------------------------------------------------------
+# ROUTE B: Instagram Direct Messages
+# Meta sends object = "instagram" for Instagram DMs
+# -------------------------------------------------------------------
+def _parse_instagram(payload: dict):
+    try:
+        # Instagram DMs also use the "messaging" structure
+        messaging_event = payload["entry"][0].get("messaging", [{}])[0]
+        message_obj = messaging_event.get("message") or {}
+
+        if "text" not in message_obj:
+            logger.debug("  ↳ Skipping non-text Instagram event.")
+            return None
+
+        # Skip echo messages (your own replies bouncing back)
+        if message_obj.get("is_echo"):
+            logger.debug("  ↳ Skipping echo message from Instagram.")
+            return None
+
+        sender_id = messaging_event["sender"]["id"]
+        logger.debug("  ↳ Instagram DM from sender_id: %s", sender_id)
+
+        return {
+            "platform": "instagram",
+            "sender_id": sender_id,
+            "thread_id": f"instagram_{sender_id}",
+            "text": message_obj["text"],
+            "user_name": "Customer",
+        }
+    except _PARSE_ERRORS as e:
+        _log_parse_error(e, payload)
+        return None
+
+
+# -------------------------------------------------------------------
+# ROUTE C: WhatsApp Cloud API
+# Meta sends object = "whatsapp_business_account" for WhatsApp.
+# The structure is completely different from A and B above.
+# -------------------------------------------------------------------
+def _parse_whatsapp(payload: dict):
+    try:
+        value = payload["entry"][0]["changes"][0]["value"]
+
+        # WhatsApp sends "status" updates (delivered, read) in the same
+        # webhook. These do NOT have a "messages" key. We skip them —
+        # this is most WhatsApp traffic, so it's checked first.
+        messages = value.get("messages")
+        if not messages:
+            logger.debug("  ↳ Skipping WhatsApp status update (delivery/read receipt).")
+            return None
+
+        message = messages[0]
+
+        # Skip non-text messages (voice notes, images, etc.)
+        message_type = message.get("type")
+        if message_type != "text":
+            logger.debug("  ↳ Skipping non-text WhatsApp message. Type: %s", message_type)
+            return None
+
+        # contacts[0] holds the user's profile info
+        contact = value.get("contacts", [{}])[0]
+        sender_id = message["from"]  # This is the user's phone number
+        user_name = contact.get("profile", {}).get("name", "Customer")
+
+        logger.debug("  ↳ WhatsApp message from %s (%s)", user_name, sender_id)
+
+        return {
+            "platform": "whatsapp",
+            "sender_id": sender_id,
+            "thread_id": f"whatsapp_{sender_id}",
+            "text": message["text"]["body"],
+            "user_name": user_name,
+        }
+    except _PARSE_ERRORS as e:
+        _log_parse_error(e, payload)
+        return None
+
+
+# Meta's "object" field → the parser for that platform's payload shape.
+# Supporting a new platform = write a parser + add one line here.
+_PARSERS = {
+    "page": _parse_messenger,
+    "instagram": _parse_instagram,
+    "whatsapp_business_account": _parse_whatsapp,
+}
+
 
 def normalize_meta_payload(payload: dict):
     """
@@ -30,121 +167,18 @@ def normalize_meta_payload(payload: dict):
     # STEP 1: Log the raw payload so you can debug on your server logs
     # ---------------------------------------------------------------
     # This is your best friend when things go wrong. Every payload
-    # that hits your server will be printed to your terminal.
+    # that hits your server is logged (at DEBUG — set LOG_LEVEL=DEBUG).
     object_type = payload.get("object", "UNKNOWN")
-    print(f"\n📦 RAW WEBHOOK RECEIVED | object type: '{object_type}'")
-
-    try:
+    logger.debug("📦 RAW WEBHOOK RECEIVED | object type: %r", object_type)
 
-        # -----------------------------------------------------------
-        # ROUTE A: Messenger (Facebook Page messages)
-        # Meta sends object = "page" for Messenger
-        # -----------------------------------------------------------
-        if object_type == "page":
-            entry = payload["entry"][0]
-
-            # Messenger uses a "messaging" array (not "changes")
-            messaging_event = entry.get("messaging", [{}])[0]
-
-            # Skip "echo" events — these are copies of YOUR OWN replies
-            # coming back to you. Ignore them or you'll loop forever.
-            if messaging_event.get("message", {}).get("is_echo"):
-                print("  ↳ Skipping echo message from Messenger.")
-                return None
-
-            # Make sure it's a real text message (not a sticker/emoji/attachment)
-            message_obj = messaging_event.get("message", {})
-            if "text" not in message_obj:
-                print(f"  ↳ Skipping non-text Messenger event (e.g. attachment, reaction).")
-                return None
-
-            sender_id = messaging_event["sender"]["id"]
-            print(f"  ↳ Messenger message from sender_id: {sender_id}")
-
-            return {
-                "platform": "messenger",
-                "sender_id": sender_id,
-                "thread_id": f"messenger_{sender_id}",
-                "text": message_obj["text"],
-                "user_name": "Customer",  # Messenger webhooks rarely include the name
-            }
-
-        # -----------------------------------------------------------
-        # ROUTE B: Instagram Direct Messages
-        # Meta sends object = "instagram" for Instagram DMs
-        # -----------------------------------------------------------
-        if object_type == "instagram":
-            entry = payload["entry"][0]
-
-            # Instagram DMs also use the "messaging" structure
-            messaging_event = entry.get("messaging", [{}])[0]
-
-            # Skip echo messages (your own replies bouncing back)
-            if messaging_event.get("message", {}).get("is_echo"):
-                print("  ↳ Skipping echo message from Instagram.")
-                return None
-
-            message_obj = messaging_event.get("message", {})
-            if "text" not in message_obj:
-                print(f"  ↳ Skipping non-text Instagram event.")
-                return None
-
-            sender_id = messaging_event["sender"]["id"]
-            print(f"  ↳ Instagram DM from sender_id: {sender_id}")
-
-            return {
-                "platform": "instagram",
-                "sender_id": sender_id,
-                "thread_id": f"instagram_{sender_id}",
-                "text": message_obj["text"],
-                "user_name": "Customer",
-            }
-
-        # -----------------------------------------------------------
-        # ROUTE C: WhatsApp Cloud API
-        # Meta sends object = "whatsapp_business_account" for WhatsApp.
-        # The structure is completely different from A and B above.
-        # -----------------------------------------------------------
-        if object_type == "whatsapp_business_account":
-            value = payload["entry"][0]["changes"][0]["value"]
-
-            # WhatsApp sends "status" updates (delivered, read) in the same
-            # webhook. These do NOT have a "messages" key. We skip them.
-            if "messages" not in value:
-                print(f"  ↳ Skipping WhatsApp status update (delivery/read receipt).")
-                return None
-
-            message = value["messages"][0]
-
-            # Skip non-text messages (voice notes, images, etc.)
-            if message.get("type") != "text":
-                print(f"  ↳ Skipping non-text WhatsApp message. Type: {message.get('type')}")
-                return None
-
-            # contacts[0] holds the user's profile info
-            contact = value.get("contacts", [{}])[0]
-            sender_id = message["from"]  # This is the user's phone number
-            user_name = contact.get("profile", {}).get("name", "Customer")
-
-            print(f"  ↳ WhatsApp message from {user_name} ({sender_id})")
-
-            return {
-                "platform": "whatsapp",
-                "sender_id": sender_id,
-                "thread_id": f"whatsapp_{sender_id}",
-                "text": message["text"]["body"],
-                "user_name": user_name,
-            }
-
-        # -----------------------------------------------------------
+    # ---------------------------------------------------------------
+    # STEP 2: Hand the payload to the parser for its platform
+    # ---------------------------------------------------------------
+    # Each parser catches its own malformed-payload errors and returns None
+    parser = _PARSERS.get(object_type)
+    if parser is None:
         # FALLBACK: Unknown object type
-        # -----------------------------------------------------------
-        print(f"  ↳ ⚠️  Unrecognized object type: '{object_type}'. Ignoring payload.")
+        logger.warning("  ↳ ⚠️  Unrecognized object type: %r. Ignoring payload.", object_type)
         return None
 
-    except (KeyError, IndexError, TypeError) as e:
-        # If ANYTHING goes wrong parsing the payload, log it clearly.
-        # This tells you exactly what broke instead of silently failing.
-        print(f"  ↳ ❌ NORMALIZATION ERROR: {type(e).__name__}: {e}")
-        print(f"  ↳ Full payload was: {payload}")
-        return None
\ No newline at end of file
+    return parser(payload)